@@ -0,0 +1,182 @@
+"""
+Measure the per-request overhead of ``jarrett.instrumentation``.
+
+Serves the same view (template rendering plus database queries) through two
+WSGI handlers in one process, one with and one without the instrumentation
+middleware, in short interleaved blocks so machine drift hits both sides
+equally. ``instrumentation.uninstall()`` runs before every baseline block, so
+the process-wide template/database patches never leak into the baseline.
+Requests go straight through the WSGI handler to keep test client overhead
+out of the measurement. The script reports the median overhead of the block
+pairs with a 95% confidence interval and exits non-zero if the median exceeds
+``--max-overhead``. It uses self-contained settings, so no secrets or
+AWS access are needed:
+
+    python benchmarks/instrumentation_overhead.py --blocks 60
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASE_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+INSTRUMENTED_MIDDLEWARE = [
+    'jarrett.instrumentation.InstrumentationMiddleware',
+    *BASE_MIDDLEWARE,
+    'jarrett.instrumentation.InstrumentationViewMiddleware',
+]
+TEMPLATE = '<ul>{% for row in rows %}<li>{{ row.0 }}: {{ row.1 }}</li>{% endfor %}</ul>'
+
+
+def configure(middleware):
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        ALLOWED_HOSTS=['testserver'],
+        ROOT_URLCONF=__name__,
+        STATIC_URL='/static/',
+        STATIC_ROOT=tempfile.gettempdir(),
+        MIDDLEWARE=middleware,
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+        ],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {'bench.html': TEMPLATE})]},
+        }],
+        METRICS_DIR=os.path.join(tempfile.gettempdir(), 'jarrett-metrics-bench'),
+        METRICS_FLUSH_INTERVAL=5,
+        METRICS_TOKEN=None,
+    )
+    django.setup()
+
+
+def bench_view(request):
+    from django.db import connection
+    from django.shortcuts import render
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT name, type FROM sqlite_master')
+        rows = cursor.fetchall()
+        cursor.execute('SELECT %s, %s', [request.path, len(rows)])
+        rows += cursor.fetchall()
+    return render(request, 'bench.html', {'rows': rows * 10})
+
+
+urlpatterns = []
+
+
+def make_client(middleware):
+    """
+    Build a WSGI handler for ``middleware`` and return a function that sends
+    it one request.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+
+    with override_settings(MIDDLEWARE=middleware):
+        handler = WSGIHandler()
+    environ = RequestFactory()._base_environ(PATH_INFO='/', REQUEST_METHOD='GET')
+
+    def start_response(status, headers, exc_info=None):
+        assert status.startswith('200'), status
+
+    def request():
+        response = handler(dict(environ), start_response)
+        b''.join(response)
+        response.close()
+
+    return request
+
+
+def time_block(request, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        request()
+    return (time.perf_counter() - start) / requests
+
+
+def median_confidence_interval(values):
+    """
+    Median of ``values`` with a distribution-free 95% confidence interval
+    taken from the order statistics, which is robust to the occasional block
+    hit by a machine hiccup.
+    """
+    ordered = sorted(values)
+    n = len(ordered)
+    half_width = 1.96 * math.sqrt(n) / 2
+    low = max(math.floor(n / 2 - half_width), 0)
+    high = min(math.ceil(n / 2 + half_width), n - 1)
+    return statistics.median(ordered), ordered[low], ordered[high]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per block')
+    parser.add_argument('--blocks', type=int, default=60, help='Paired baseline/instrumented blocks')
+    parser.add_argument('--max-overhead', type=float, default=5.0, help='Maximum allowed median overhead in percent')
+    args = parser.parse_args()
+
+    configure(BASE_MIDDLEWARE)
+    from django.urls import path
+
+    from jarrett import instrumentation
+
+    urlpatterns.append(path('', bench_view))
+    baseline_request = make_client(BASE_MIDDLEWARE)
+    instrumented_request = make_client(INSTRUMENTED_MIDDLEWARE)
+
+    def baseline_block():
+        instrumentation.uninstall()
+        return time_block(baseline_request, args.requests)
+
+    def instrumented_block():
+        instrumentation.install()
+        return time_block(instrumented_request, args.requests)
+
+    # Warm up both paths
+    baseline_block()
+    instrumented_block()
+
+    baselines, instrumented, overheads = [], [], []
+    for i in range(args.blocks):
+        # Alternate which side goes first so drift within a pair cancels out
+        if i % 2 == 0:
+            baseline, instrumented_time = baseline_block(), instrumented_block()
+        else:
+            instrumented_time, baseline = instrumented_block(), baseline_block()
+        baselines.append(baseline)
+        instrumented.append(instrumented_time)
+        overheads.append((instrumented_time / baseline - 1) * 100)
+
+    median, low, high = median_confidence_interval(overheads)
+    print(f'baseline:     {statistics.median(baselines) * 1e6:8.1f} us/request (median of {args.blocks} blocks)')
+    print(f'instrumented: {statistics.median(instrumented) * 1e6:8.1f} us/request (median of {args.blocks} blocks)')
+    print(f'overhead:     {median:8.2f} % (95% CI {low:.2f} .. {high:.2f} %)')
+    return 0 if median <= args.max_overhead else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+HTTP load test and latency benchmark.
+
+Drives the given paths against either the in-process live server used by the
+Selenium tests (``--server live``) or a real gunicorn subprocess
+(``--server gunicorn``) and reports throughput and p50/p95/p99 latency.
+The live server shares the GIL with the load generator, so use gunicorn for
+absolute numbers and the live server for quick relative comparisons.
+
+``--stub-aws`` also benchmarks the private download view and CloudFront URL
+signing in-process against local S3/CloudFront stubs, so no AWS access is
+needed. Results can be saved with ``--output`` and checked against a previous
+run with ``--compare``:
+
+    python benchmarks/load_test.py --concurrency 8 --requests 2000 --output bench.json
+    python benchmarks/load_test.py --concurrency 8 --requests 2000 --compare bench.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jarrett.settings.dev')
+
+import django
+
+DEFAULT_PATHS = ['/', '/admin/login/']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank: the smallest value with at least pct% of the values at or below it
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def measure(func, concurrency, requests, warmup):
+    """
+    Call ``func`` ``requests`` times from ``concurrency`` threads.
+
+    ``func`` performs one request and returns ``True`` on success.
+    """
+    if requests < 1:
+        raise ValueError('requests must be at least 1')
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                ok = func()
+            except Exception:
+                ok = False
+            local_latencies.append(time.perf_counter() - start)
+            local_errors += not ok
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+def http_get(host, port, path, timeout):
+    def request():
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            # A 400 from ALLOWED_HOSTS or a 404 for a mistyped path must not count as throughput
+            return 200 <= response.status < 400
+        finally:
+            conn.close()
+    return request
+
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(.1)
+    raise RuntimeError(f'Server did not start listening on {host}:{port} within {timeout}s')
+
+
+def free_port(host):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class LiveServer:
+
+    def __init__(self, host):
+        from django.contrib.staticfiles.handlers import StaticFilesHandler
+        from jarrett.testing.selenium.classes import ConnectionResetErrorSwallowingLiveServerThread
+
+        self.host = host
+        self.thread = ConnectionResetErrorSwallowingLiveServerThread(host, StaticFilesHandler)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        self.thread.is_ready.wait()
+        if self.thread.error:
+            raise self.thread.error
+        return self.host, self.thread.port
+
+    def __exit__(self, *exc_info):
+        self.thread.terminate()
+
+
+class GunicornServer:
+
+    def __init__(self, host, workers):
+        self.host = host
+        self.port = free_port(host)
+        self.workers = workers
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'jarrett.wsgi', '--bind', f'{self.host}:{self.port}',
+             '--workers', str(self.workers), '--log-level', 'warning'],
+            env=dict(os.environ),
+        )
+        try:
+            wait_for_port(self.host, self.port, timeout=30)
+        except BaseException:
+            self.__exit__(*sys.exc_info())
+            raise
+        return self.host, self.port
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def run_stubbed(args, results):
+    """
+    Benchmark the private download view and CloudFront signing against local stubs.
+    """
+    from django.conf import settings
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+
+    from jarrett.testing.aws_stub import stub_aws
+    from jarrett.util_aws import signed_cf_url
+    from jarrett.views import PrivateFileDownload
+
+    key = 'benchmark/object.bin'
+    factory = RequestFactory()
+    staff = SimpleNamespace(is_active=True, is_staff=True)
+    view = PrivateFileDownload.as_view()
+
+    def download():
+        request = factory.get(f'/private/{key}')
+        request.user = staff
+        response = view(request, key=key)
+        for _ in response.streaming_content:
+            pass
+        response.close()
+        return response.status_code == 200
+
+    def sign():
+        return bool(signed_cf_url(settings.S3_PRIVATE_FILES_DOMAIN_NAME, key))
+
+    with stub_aws() as (s3, _), tempfile.TemporaryDirectory() as cache_dir:
+        s3.put_object(Bucket=settings.S3_PRIVATE_FILES_BUCKET_NAME, Key=key, Body=os.urandom(args.object_size))
+        with override_settings(PRIVATE_DOWNLOAD_CACHE_DIR=cache_dir, PRIVATE_DOWNLOAD_CACHE_MAX_OBJECT_BYTES=0):
+            results['stub:private_download'] = measure(download, args.concurrency, args.requests, args.warmup)
+        with override_settings(PRIVATE_DOWNLOAD_CACHE_DIR=cache_dir):
+            results['stub:private_download_cached'] = measure(download, args.concurrency, args.requests,
+                                                              max(args.warmup, 1))
+        results['stub:signed_cf_url'] = measure(sign, args.concurrency, args.requests, args.warmup)
+
+
+def percent_change(new, old):
+    if old:
+        return (new / old - 1) * 100
+    return 0.0 if new == old else math.inf
+
+
+def compare(results, baseline, max_regression):
+    """
+    Print the change against ``baseline`` and return ``False`` if any benchmark
+    lost more than ``max_regression`` percent of throughput or p95 latency.
+    """
+    ok = True
+    print(f'\n{"benchmark":<40} {"rps":>10} {"p95 ms":>10}')
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f'{name:<40} {"new":>10} {"new":>10}')
+            continue
+        rps_change = percent_change(result['throughput_rps'], previous['throughput_rps'])
+        p95_change = percent_change(result['p95_ms'], previous['p95_ms'])
+        regressed = rps_change < -max_regression or p95_change > max_regression
+        ok = ok and not regressed
+        print(f'{name:<40} {rps_change:>+9.1f}% {p95_change:>+9.1f}%{"  REGRESSION" if regressed else ""}')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['live', 'gunicorn'], default='live')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--path', action='append', dest='paths', help=f'Path to request (default {DEFAULT_PATHS})')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per benchmark')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--stub-aws', action='store_true', help='Also benchmark storage/signing against local stubs')
+    parser.add_argument('--object-size', type=int, default=1024 * 1024, help='Stubbed private object size in bytes')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Compare against a previous results JSON file')
+    parser.add_argument('--max-regression', type=float, default=10.0, help='Allowed regression in percent')
+    args = parser.parse_args()
+    if args.requests < 1 or args.concurrency < 1:
+        parser.error('--requests and --concurrency must be at least 1')
+
+    django.setup()
+
+    results = {}
+    server = LiveServer(args.host) if args.server == 'live' else GunicornServer(args.host, args.workers)
+    with server as (host, port):
+        for path in args.paths or DEFAULT_PATHS:
+            results[f'http:{path}'] = measure(http_get(host, port, path, args.timeout),
+                                              args.concurrency, args.requests, args.warmup)
+    if args.stub_aws:
+        run_stubbed(args, results)
+
+    print(f'{"benchmark":<40} {"rps":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for name, result in results.items():
+        print(f'{name:<40} {result["throughput_rps"]:>10.1f} {result["p50_ms"]:>9.2f} '
+              f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["errors"]:>7}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(),
+                    'server': args.server,
+                    'concurrency': args.concurrency,
+                    'requests': args.requests,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if not compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,8 @@ from django.conf import settings
 from django.contrib.staticfiles import finders
 from django.core.files.temp import NamedTemporaryFile
 
+from jarrett.compress_toolchain.profiler import build_span, content_size, get_profiler
+
 if system() != "Windows":
     try:
         from shlex import quote as shell_quote  # Python 3
@@ -45,6 +47,12 @@ def get_all_static():
     return static_dirs
 
 
+class _KeepMissing(dict):
+    # Leaves placeholders that are only filled in by CompilerFilter.input() as-is
+    def __missing__(self, key):
+        return '{%s}' % key
+
+
 class BaseCompiler(CompilerFilter):
     # Temporary input file extension
     infile_ext = ''
@@ -65,7 +73,23 @@ class BaseCompiler(CompilerFilter):
                     ('infile', self.infile.name),
                 )
 
-        return super(BaseCompiler, self).input(**kwargs)
+        if get_profiler() is None:
+            return super(BaseCompiler, self).input(**kwargs)
+
+        options = _KeepMissing(self.options)
+        if self.filename is not None:
+            options.setdefault('infile', self.filename)
+        for name in ('infile', 'outfile'):
+            if name in options:
+                options[name] = shell_quote(options[name])
+        with build_span(self.__class__.__name__, 'compile',
+                        command=self.command.format_map(options),
+                        filename=self.filename,
+                        input_size=content_size(self.content),
+                        cache_hit=False) as span:
+            output = super(BaseCompiler, self).input(**kwargs)
+            span['output_size'] = content_size(output)
+            return output
 
 
 class SCSSCompiler(BaseCompiler):
@@ -0,0 +1,165 @@
+"""
+Build-pipeline profiler for ``compress`` and ``collectstatic``.
+
+Set ``BUILD_PROFILE_DIR`` to turn it on. Every span is kept in memory and, when
+the process exits, written to ``BUILD_PROFILE_DIR`` as a Chrome trace-event
+file (open it in ``chrome://tracing`` or https://ui.perfetto.dev) together
+with a summary table. The summary is also saved as
+``summary-latest-<command>.json`` and the next run of the same management
+command prints its totals against it.
+"""
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+
+
+class BuildProfiler:
+
+    def __init__(self, output_dir, command=None):
+        self.output_dir = output_dir
+        self.command = command or current_command()
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        atexit.register(self.write)
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """
+        Record a complete ("X") trace event around the block. The yielded dict
+        is stored as the event's ``args``, so callers can add ``output_size``
+        or ``cache_hit`` once they know it.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self._origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def summarize(self):
+        rows = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'cache_hits': 0,
+                                    'input_size': 0, 'output_size': 0})
+        for event in self.events:
+            row = rows[f'{event["cat"]}:{event["name"]}']
+            ms = event['dur'] / 1000
+            row['count'] += 1
+            row['total_ms'] += ms
+            row['max_ms'] = max(row['max_ms'], ms)
+            row['cache_hits'] += int(bool(event['args'].get('cache_hit')))
+            row['input_size'] += event['args'].get('input_size') or 0
+            row['output_size'] += event['args'].get('output_size') or 0
+        return dict(rows)
+
+    @staticmethod
+    def format_summary(summary, previous=None):
+        previous = previous or {}
+        header = f'{"span":<40} {"count":>6} {"total ms":>10} {"max ms":>9} {"hits":>5} ' \
+                 f'{"in KB":>9} {"out KB":>9} {"vs last":>9}'
+        lines = [header, '-' * len(header)]
+        for name, row in sorted(summary.items(), key=lambda item: -item[1]['total_ms']):
+            if name in previous:
+                delta = f'{row["total_ms"] - previous[name]["total_ms"]:+.1f}'
+            else:
+                delta = 'new'
+            lines.append(f'{name:<40} {row["count"]:>6} {row["total_ms"]:>10.1f} {row["max_ms"]:>9.1f} '
+                         f'{row["cache_hits"]:>5} {row["input_size"] / 1024:>9.1f} '
+                         f'{row["output_size"] / 1024:>9.1f} {delta:>9}')
+        return '\n'.join(lines)
+
+    def write(self):
+        if not self.events:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = f'{self.command}-{datetime.now().strftime("%Y%m%d-%H%M%S")}-{os.getpid()}'
+        with open(os.path.join(self.output_dir, f'trace-{stamp}.json'), 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+        summary = self.summarize()
+        latest_path = os.path.join(self.output_dir, f'summary-latest-{self.command}.json')
+        try:
+            with open(latest_path) as f:
+                previous = json.load(f)
+        except (IOError, json.decoder.JSONDecodeError):
+            previous = None
+        table = self.format_summary(summary, previous)
+        with open(os.path.join(self.output_dir, f'summary-{stamp}.txt'), 'w') as f:
+            f.write(table + '\n')
+        with open(latest_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(table)
+
+
+def current_command():
+    """
+    Name of the running management command (``compress``, ``collectstatic``...),
+    so each command's summary is only compared against its own previous run.
+    """
+    command = sys.argv[1] if len(sys.argv) > 1 else os.path.basename(sys.argv[0]) or 'build'
+    return re.sub(r'[^\w.-]', '_', command)
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    global _profiler
+    output_dir = getattr(settings, 'BUILD_PROFILE_DIR', None)
+    if not output_dir:
+        return None
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = BuildProfiler(output_dir)
+    return _profiler
+
+
+@contextmanager
+def build_span(name, category, **args):
+    """
+    ``BuildProfiler.span`` on the process-wide profiler, or a no-op yielding a
+    throwaway dict when ``BUILD_PROFILE_DIR`` is not set.
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        yield args
+        return
+    with profiler.span(name, category, **args) as span_args:
+        yield span_args
+
+
+def content_size(content):
+    """
+    Best-effort byte size of a string or Django ``File``.
+    """
+    if content is None:
+        return None
+    if isinstance(content, str):
+        return len(content.encode())
+    if isinstance(content, bytes):
+        return len(content)
+    try:
+        return content.size
+    except (AttributeError, OSError, TypeError):
+        return None
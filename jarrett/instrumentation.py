@@ -0,0 +1,457 @@
+"""
+Always-on, low-overhead request instrumentation.
+
+Each worker keeps cumulative histograms in memory and periodically writes a
+snapshot to ``METRICS_DIR`` (and once more when it exits). The ``metrics`` view
+sums the snapshots of every worker and renders them in the Prometheus text
+format. Totals of dead workers are folded into an archive snapshot rather than
+dropped, so the exported series never go backwards when gunicorn recycles a
+worker.
+
+Place ``InstrumentationMiddleware`` first and ``InstrumentationViewMiddleware``
+last in ``MIDDLEWARE``; the difference between the two is the time spent in the
+middleware stack itself.
+"""
+import atexit
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+# Per-request accumulators, ``None`` outside of a request
+_timings = ContextVar('jarrett_request_timings', default=None)
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram. ``observe`` is a bisect and two
+    additions under a lock, so it is cheap enough to call on every request.
+    Histograms of a registry share its lock so a request's observations can be
+    recorded with one acquisition, see ``Registry.observe_many``.
+    """
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS, lock=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = lock or threading.Lock()
+
+    def _record(self, value):
+        # Caller holds self._lock
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def observe(self, value):
+        with self._lock:
+            self._record(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'documentation': self.documentation,
+                'buckets': list(self.buckets),
+                'counts': list(self.counts),
+                'sum': self.sum,
+            }
+
+
+class Registry:
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self.histograms.setdefault(name, Histogram(name, documentation, buckets, self._lock))
+
+    def observe_many(self, observations):
+        """
+        Record ``(histogram, value)`` pairs under a single lock acquisition.
+        """
+        with self._lock:
+            for histogram, value in observations:
+                histogram._record(value)
+
+    def snapshot(self):
+        return {name: h.snapshot() for name, h in self.histograms.items()}
+
+    def flush(self, force=False):
+        """
+        Write this worker's snapshot to ``METRICS_DIR`` at most once every
+        ``METRICS_FLUSH_INTERVAL`` seconds. Write errors are logged, never
+        raised, so metrics can't fail a request.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = now
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            path = os.path.join(settings.METRICS_DIR, f'worker-{os.getpid()}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception('Could not write metrics snapshot to %s', settings.METRICS_DIR)
+        finally:
+            self._flush_lock.release()
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram('jarrett_request_seconds', 'Total time spent handling a request')
+MIDDLEWARE_SECONDS = registry.histogram('jarrett_middleware_seconds', 'Time spent in the middleware stack')
+VIEW_SECONDS = registry.histogram('jarrett_view_seconds', 'Time spent in the view, including rendering')
+TEMPLATE_SECONDS = registry.histogram('jarrett_template_seconds', 'Time spent rendering templates per request')
+COMPRESS_SECONDS = registry.histogram('jarrett_compress_seconds', 'Time spent in {% compress %} per request')
+DB_SECONDS = registry.histogram('jarrett_db_seconds', 'Time spent in database queries per request')
+DB_QUERIES = registry.histogram('jarrett_db_queries', 'Database queries per request', COUNT_BUCKETS)
+AWS_SECONDS = registry.histogram('jarrett_aws_seconds', 'Time spent in boto3 calls per request')
+AWS_CALLS = registry.histogram('jarrett_aws_calls', 'boto3 calls per request', COUNT_BUCKETS)
+
+
+def _add(key, value):
+    timings = _timings.get()
+    if timings is not None:
+        timings[key] = timings.get(key, 0) + value
+
+
+def _timed(func, key):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _add(key, time.perf_counter() - start)
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings['db'] = timings.get('db', 0) + time.perf_counter() - start
+        timings['db_queries'] = timings.get('db_queries', 0) + 1
+
+
+def _install_db_wrapper(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def _boto_before_call(context, **kwargs):
+    context['jarrett_start'] = time.perf_counter()
+
+
+def _boto_after_call(context, **kwargs):
+    start = context.pop('jarrett_start', None)
+    if start is not None:
+        _add('aws', time.perf_counter() - start)
+        _add('aws_calls', 1)
+
+
+def register_boto_events(events):
+    """
+    Time every API call made through a boto3 session or client event emitter.
+    """
+    events.register('before-call', _boto_before_call, unique_id='jarrett-before-call')
+    events.register('after-call', _boto_after_call, unique_id='jarrett-after-call')
+
+
+_installed = False
+
+
+def install():
+    """
+    Hook database connections, template rendering and ``{% compress %}``
+    once per process.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    connection_created.connect(_install_db_wrapper)
+    for connection in connections.all():
+        _install_db_wrapper(connection)
+
+    from django.template.backends.django import Template
+    Template.render = _timed(Template.render, 'template')
+
+    try:
+        from compressor.templatetags.compress import CompressorNode
+    except ImportError:
+        pass
+    else:
+        CompressorNode.render = _timed(CompressorNode.render, 'compress')
+
+
+def uninstall():
+    """
+    Undo ``install()``, e.g. to compare against an uninstrumented baseline.
+    """
+    global _installed
+    if not _installed:
+        return
+    _installed = False
+
+    connection_created.disconnect(_install_db_wrapper)
+    for connection in connections.all():
+        if _db_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(_db_wrapper)
+
+    from django.template.backends.django import Template
+    Template.render = Template.render.__wrapped__
+
+    try:
+        from compressor.templatetags.compress import CompressorNode
+    except ImportError:
+        pass
+    else:
+        CompressorNode.render = CompressorNode.render.__wrapped__
+
+
+_exit_flush_registered = False
+
+
+def _register_exit_flush():
+    # Observations since the last periodic flush would otherwise be lost when a worker exits
+    global _exit_flush_registered
+    if not _exit_flush_registered:
+        _exit_flush_registered = True
+        atexit.register(registry.flush, force=True)
+
+
+class InstrumentationMiddleware:
+    """
+    Outermost middleware: times the whole request and records the per-request
+    accumulators into the worker histograms.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+        _register_exit_flush()
+
+    def __call__(self, request):
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _timings.reset(token)
+            observations = [
+                (REQUEST_SECONDS, total),
+                (TEMPLATE_SECONDS, timings.get('template', 0)),
+                (COMPRESS_SECONDS, timings.get('compress', 0)),
+                (DB_SECONDS, timings.get('db', 0)),
+                (DB_QUERIES, timings.get('db_queries', 0)),
+                (AWS_SECONDS, timings.get('aws', 0)),
+                (AWS_CALLS, timings.get('aws_calls', 0)),
+            ]
+            if 'view' in timings:
+                observations.append((VIEW_SECONDS, timings['view']))
+                observations.append((MIDDLEWARE_SECONDS, max(total - timings['view'], 0)))
+            registry.observe_many(observations)
+            registry.flush()
+
+
+class InstrumentationViewMiddleware:
+    """
+    Innermost middleware: times the view (and response rendering) alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = _timed(get_response, 'view')
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+
+ARCHIVE_NAME = 'archive.json'
+ARCHIVE_LOCK_NAME = 'archive.lock'
+ARCHIVE_LOCK_TIMEOUT = 60
+
+
+def _worker_alive(pid):
+    if pid == os.getpid():
+        # On Windows os.kill() terminates the process whatever the signal
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, json.decoder.JSONDecodeError):
+        return default
+
+
+def _merge(merged, snapshot):
+    for name, data in snapshot.items():
+        if name not in merged:
+            merged[name] = {**data, 'counts': list(data['counts'])}
+            continue
+        total = merged[name]
+        if total['buckets'] != data['buckets']:
+            # Bucket layout changed between deploys, the counts can't be added up
+            continue
+        total['counts'] = [a + b for a, b in zip(total['counts'], data['counts'])]
+        total['sum'] += data['sum']
+    return merged
+
+
+def _acquire_archive_lock(path):
+    try:
+        if time.time() - os.path.getmtime(path) > ARCHIVE_LOCK_TIMEOUT:
+            # Left behind by a worker that died while holding it
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return False
+    return True
+
+
+def _archive_dead_workers(metrics_dir, dead_pids):
+    """
+    Fold the snapshots of ``dead_pids`` into the archive and remove them. The
+    archive lists the pids it already contains, so a worker is never counted
+    twice even if this is interrupted between writing the archive and
+    removing the snapshots. Concurrent scrapes skip archiving while another
+    one holds the lock.
+    """
+    lock_path = os.path.join(metrics_dir, ARCHIVE_LOCK_NAME)
+    if not _acquire_archive_lock(lock_path):
+        return
+    try:
+        archive_path = os.path.join(metrics_dir, ARCHIVE_NAME)
+        archive = _read_json(archive_path, {'pids': [], 'metrics': {}})
+        archived_pids = set(archive['pids'])
+        for pid in set(dead_pids) - archived_pids:
+            snapshot = _read_json(os.path.join(metrics_dir, f'worker-{pid}.json'), None)
+            if snapshot is not None:
+                _merge(archive['metrics'], snapshot)
+                archived_pids.add(pid)
+        # Only keep the pids whose snapshots still need removing
+        archive['pids'] = sorted(pid for pid in archived_pids
+                                 if os.path.exists(os.path.join(metrics_dir, f'worker-{pid}.json')))
+        tmp_path = f'{archive_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(archive, f)
+        os.replace(tmp_path, archive_path)
+        for pid in archive['pids']:
+            try:
+                os.remove(os.path.join(metrics_dir, f'worker-{pid}.json'))
+            except FileNotFoundError:
+                pass
+    except OSError:
+        logger.exception('Could not archive metrics snapshots in %s', metrics_dir)
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def aggregate_snapshots(metrics_dir):
+    """
+    Sum the archive and the snapshot of every worker in ``metrics_dir``.
+    Snapshots left behind by dead workers are folded into the archive, so
+    their counts keep being exported.
+    """
+    try:
+        entries = list(os.scandir(metrics_dir))
+    except FileNotFoundError:
+        return {}
+    archive = _read_json(os.path.join(metrics_dir, ARCHIVE_NAME), {'pids': [], 'metrics': {}})
+    archived_pids = set(archive['pids'])
+    merged = _merge({}, archive['metrics'])
+    dead_pids = []
+    for entry in entries:
+        if not (entry.name.startswith('worker-') and entry.name.endswith('.json')):
+            continue
+        pid = int(entry.name[len('worker-'):-len('.json')])
+        if pid in archived_pids:
+            continue
+        snapshot = _read_json(entry.path, None)
+        if snapshot is None:
+            continue
+        _merge(merged, snapshot)
+        if not _worker_alive(pid):
+            dead_pids.append(pid)
+    if dead_pids or archived_pids:
+        _archive_dead_workers(metrics_dir, dead_pids)
+    return merged
+
+
+def render_prometheus(snapshot):
+    lines = []
+    for name, data in sorted(snapshot.items()):
+        lines.append(f'# HELP {name} {data["documentation"]}')
+        lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, count in zip(data['buckets'], data['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += data['counts'][-1]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum {data["sum"]}')
+        lines.append(f'{name}_count {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Requires ``Authorization: Bearer <METRICS_TOKEN>``;
+    without a configured token it is only served when ``DEBUG`` is on.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        # compare_digest only accepts ASCII str, so compare the encoded bytes
+        authorization = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    registry.flush(force=True)
+    return HttpResponse(render_prometheus(aggregate_snapshots(settings.METRICS_DIR)),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from urllib.parse import quote
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single ``Range: bytes=...`` header against an object of ``size`` bytes.
+
+    :return: ``(start, end)`` inclusive byte offsets, or ``None`` if the header
+        is missing, malformed or asks for multiple ranges (the full object is
+        served in that case, which RFC 7233 allows)
+    :raises UnsatisfiableRange: if the range lies entirely outside the object
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise UnsatisfiableRange
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and start > int(last):
+        return None
+    if start >= size:
+        raise UnsatisfiableRange
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    """
+    Check an ``If-None-Match`` header against an S3 ``ETag`` (weak comparison).
+    """
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def content_disposition(filename):
+    """
+    ``Content-Disposition: attachment`` header value for ``filename``, quoted
+    like Django's ``FileResponse`` does. Names that can't go into a quoted
+    string as-is (non-ASCII or control characters) use RFC 6266
+    ``filename*=utf-8''...`` instead.
+    """
+    if filename.isascii() and filename.isprintable():
+        escaped = filename.replace('\\', '\\\\').replace('"', r'\"')
+        return f'attachment; filename="{escaped}"'
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+class PrivateFileCache:
+    """
+    Bounded on-disk cache for hot ``PrivateStorage`` objects.
+
+    Entries are keyed on the S3 key and ETag, so a re-uploaded object never
+    serves stale bytes. Once the directory grows past ``max_bytes`` the least
+    recently used entries are removed. Writes go to a temp file and are moved
+    into place atomically, so concurrent workers can share the directory.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def path(self, key, etag):
+        return self.root / hashlib.sha256(f'{key}:{etag}'.encode()).hexdigest()
+
+    def open(self, key, etag):
+        """
+        Open a cached entry for reading, or return ``None`` on a miss. The file
+        is opened here rather than when the response is streamed, so a
+        concurrent ``evict()`` can't remove it after the headers are sent.
+        """
+        path = self.path(key, etag)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def open_temp(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.root, prefix='.tmp-', delete=False)
+
+    def commit(self, temp_file, key, etag):
+        temp_file.close()
+        os.replace(temp_file.name, self.path(key, etag))
+        self.evict()
+
+    @staticmethod
+    def discard(temp_file):
+        temp_file.close()
+        try:
+            os.remove(temp_file.name)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already evicted, or still open by a download on Windows
+                pass
+            total -= size
+
+
+def stream_s3_body(body, chunk_size, cache=None, key=None, etag=None):
+    """
+    Yield an S3 ``StreamingBody`` in ``chunk_size`` pieces, optionally teeing
+    the bytes into ``cache``. The cache entry is only committed once the whole
+    body has been read, so aborted downloads never leave partial files behind.
+    """
+    temp_file = cache.open_temp() if cache else None
+    try:
+        for chunk in body.iter_chunks(chunk_size):
+            if temp_file:
+                temp_file.write(chunk)
+            yield chunk
+        if temp_file:
+            cache.commit(temp_file, key, etag)
+            temp_file = None
+    finally:
+        body.close()
+        if temp_file:
+            cache.discard(temp_file)
+
+
+def stream_file(f, start, length, chunk_size):
+    """
+    Yield ``length`` bytes of the open file ``f`` from ``start`` and close it.
+    """
+    with f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -6,6 +6,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 from jarrett.config import Config
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'jarrett.instrumentation.InstrumentationMiddleware',               # Must stay first
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,7 +38,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'ratelimitbackend.middleware.RateLimitMiddleware'
+    'ratelimitbackend.middleware.RateLimitMiddleware',
+    'jarrett.instrumentation.InstrumentationViewMiddleware',           # Must stay last
 ]
 
 ROOT_URLCONF = 'jarrett.urls'
@@ -60,6 +63,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'jarrett.wsgi.application'
 
+# Instrumentation
+METRICS_DIR = Path(tempfile.gettempdir()) / 'jarrett-metrics'      # Per-worker snapshots, shared by all workers
+METRICS_FLUSH_INTERVAL = 5                                         # Seconds between snapshot writes
+METRICS_TOKEN = conf.get('METRICS_TOKEN', None)                    # Bearer token required to scrape /metrics outside DEBUG
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -121,6 +129,7 @@ COMPRESS_PRECOMPILERS = (
     ('module', 'jarrett.compress_toolchain.precompilers.ES6Compiler'),
     ('css', 'jarrett.compress_toolchain.precompilers.SCSSCompiler'),
 )
+BUILD_PROFILE_DIR = conf.get('BUILD_PROFILE_DIR', None)            # Write Chrome traces of compress/collectstatic here
 
 # AWS Credentials
 CF_ACCESS_KEY = conf['CF_ACCESS_KEY']                               # Programmatic access to CF account
@@ -141,6 +150,12 @@ CF_PRIVATE_DISTRO_ID = conf['CF_PRIVATE_DISTRO_ID']
 S3_PRIVATE_FILES_BUCKET_NAME = conf['S3_PRIVATE_FILES_BUCKET_NAME']
 S3_PRIVATE_FILES_DOMAIN_NAME = conf['S3_PRIVATE_FILES_DOMAIN_NAME']
 
+# Private file downloads proxied through the app
+PRIVATE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PRIVATE_DOWNLOAD_CACHE_DIR = BASE_DIR / 'private_cache'
+PRIVATE_DOWNLOAD_CACHE_MAX_BYTES = 256 * 1024 * 1024               # Total size of the local disk cache
+PRIVATE_DOWNLOAD_CACHE_MAX_OBJECT_BYTES = 16 * 1024 * 1024          # Larger objects are always streamed from S3
+
 COMPRESS_ENABLED = True
 
 STATICFILES_FINDERS = [
@@ -8,7 +8,9 @@ SECURE_SSL_REDIRECT = False
 
 if 'test' not in sys.argv:
     INSTALLED_APPS += ['debug_toolbar', ]
-    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware', ]
+    # Before InstrumentationViewMiddleware, so toolbar time isn't counted as view time
+    MIDDLEWARE.insert(MIDDLEWARE.index('jarrett.instrumentation.InstrumentationViewMiddleware'),
+                      'debug_toolbar.middleware.DebugToolbarMiddleware')
 
 # Database
 DATABASES = {
@@ -47,3 +49,4 @@ DEBUG_TOOLBAR_PANELS = [
 
 # Testing
 SELENIUM_IMPLICIT_WAIT_TIME = conf['SELENIUM_IMPLICIT_WAIT_TIME']
+SELENIUM_HEADLESS = str(conf.get('SELENIUM_HEADLESS', True)).lower() not in ('0', 'false')    # Set to false to watch
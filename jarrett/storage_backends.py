@@ -2,6 +2,8 @@ from django.conf import settings
 from django.core.files.storage import get_storage_class
 from storages.backends.s3boto3 import Config, S3Boto3Storage
 
+from jarrett.compress_toolchain.profiler import build_span, content_size, get_profiler
+from jarrett.instrumentation import register_boto_events
 from jarrett.util_aws import invalidate_static_manifest
 
 
@@ -16,6 +18,15 @@ class CustomS3BotoStorage(S3Boto3Storage):
         },
     )
 
+    @property
+    def connection(self):
+        connection = super().connection
+        events = connection.meta.client.meta.events
+        if not getattr(events, 'jarrett_instrumented', False):
+            register_boto_events(events)
+            events.jarrett_instrumented = True
+        return connection
+
 
 class StaticStorage(CustomS3BotoStorage):
     location = settings.STATICFILES_LOCATION
@@ -39,10 +50,31 @@ class CachedStaticStorage(StaticStorage):
         super().__init__(*args, **kwargs)
         self.local_storage = get_storage_class(
             "compressor.storage.CompressorFileStorage")()
+        # Spans of exists() calls that found the file, until it turns out whether it is uploaded anyway
+        self._exists_spans = {}
+
+    def exists(self, name):
+        # django-compressor skips writing output files that already exist, so a hit here is a build cache hit.
+        # collectstatic re-uploads existing files that are older than the source though; save() takes the hit
+        # back then.
+        with build_span('exists', 'storage', path=name) as span:
+            span['cache_hit'] = super().exists(name)
+            if span['cache_hit'] and get_profiler() is not None:
+                self._exists_spans[name] = span
+            return span['cache_hit']
 
     def save(self, name, content, max_length=None):
-        self.local_storage._save(name, content)
-        super().save(name, self.local_storage._open(name), max_length=max_length)
-        if name == f'{settings.COMPRESS_OUTPUT_DIR}/manifest.json':
-            invalidate_static_manifest(name)
+        exists_span = self._exists_spans.pop(name, None)
+        if exists_span is not None:
+            exists_span['cache_hit'] = False
+        with build_span('save', 'storage', path=name, input_size=content_size(content)) as span:
+            with build_span('local_save', 'storage', path=name):
+                self.local_storage._save(name, content)
+            with build_span('s3_upload', 'storage', path=name) as upload_span:
+                local_file = self.local_storage._open(name)
+                upload_span['output_size'] = span['output_size'] = content_size(local_file)
+                super().save(name, local_file, max_length=max_length)
+            if name == f'{settings.COMPRESS_OUTPUT_DIR}/manifest.json':
+                with build_span('invalidate_static_manifest', 'cloudfront', path=name):
+                    invalidate_static_manifest(name)
         return name
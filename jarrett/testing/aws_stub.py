@@ -0,0 +1,211 @@
+import hashlib
+import io
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from types import SimpleNamespace
+from unittest import mock
+
+import boto3
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.files.base import ContentFile
+from django.test.utils import override_settings
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from jarrett import util_aws
+from jarrett.private_files import UnsatisfiableRange, parse_range_header
+
+
+class StubBody:
+    """
+    Stand-in for botocore's ``StreamingBody``.
+    """
+
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class StubS3Client:
+    """
+    In-memory replacement for the subset of the boto3 S3 client this project uses.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(dict)
+        self.meta = SimpleNamespace(events=HierarchicalEmitter())
+
+    @staticmethod
+    def _not_found(operation):
+        return ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType='binary/octet-stream', **kwargs):
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode()
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        self.buckets[Bucket][Key] = {'Body': Body, 'ContentType': ContentType, 'ETag': etag}
+        return {'ETag': etag}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        try:
+            obj = self.buckets[Bucket][Key]
+        except KeyError:
+            raise self._not_found('HeadObject')
+        return {'ContentLength': len(obj['Body']), 'ContentType': obj['ContentType'], 'ETag': obj['ETag']}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        try:
+            obj = self.buckets[Bucket][Key]
+        except KeyError:
+            raise self._not_found('GetObject')
+        if IfMatch is not None and IfMatch != obj['ETag']:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'Precondition Failed'}}, 'GetObject')
+        data = obj['Body']
+        try:
+            byte_range = parse_range_header(Range, len(data))
+        except UnsatisfiableRange:
+            raise ClientError({'Error': {'Code': 'InvalidRange', 'Message': 'The requested range is not satisfiable'}},
+                              'GetObject')
+        if byte_range is not None:
+            start, end = byte_range
+            data = data[start:end + 1]
+        return {'Body': StubBody(data), 'ContentLength': len(data), 'ContentType': obj['ContentType'],
+                'ETag': obj['ETag']}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.buckets[Bucket].pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        if len(Delete['Objects']) > 1000:
+            raise ClientError({'Error': {'Code': 'MalformedXML', 'Message': 'Too many keys'}}, 'DeleteObjects')
+        for obj in Delete['Objects']:
+            self.buckets[Bucket].pop(obj['Key'], None)
+        return {} if Delete.get('Quiet') else {'Deleted': [{'Key': obj['Key']} for obj in Delete['Objects']]}
+
+
+class StubCloudFrontClient:
+    """
+    In-memory replacement for the boto3 CloudFront client. Invalidations are
+    recorded rather than sent.
+    """
+
+    def __init__(self):
+        self.invalidations = []
+        self.meta = SimpleNamespace(events=HierarchicalEmitter())
+
+    def create_invalidation(self, DistributionId, InvalidationBatch):
+        self.invalidations.append((DistributionId, InvalidationBatch))
+        return {'Invalidation': {'Id': f'STUB{len(self.invalidations)}', 'Status': 'Completed'}}
+
+
+def storage_key(storage, name):
+    """
+    The S3 key ``S3Boto3Storage`` writes ``name`` to.
+    """
+    return storage._normalize_name(clean_name(name))
+
+
+@contextmanager
+def stub_s3_storage(s3):
+    """
+    Route reads and writes of every ``S3Boto3Storage`` (and subclass) to ``s3``.
+    """
+
+    def _save(storage, name, content):
+        cleaned_name = clean_name(name)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        content_type = getattr(content, 'content_type', None) or 'binary/octet-stream'
+        s3.put_object(Bucket=storage.bucket_name, Key=storage_key(storage, name), Body=content.read(),
+                      ContentType=content_type)
+        return cleaned_name
+
+    def _open(storage, name, mode='rb'):
+        obj = s3.get_object(Bucket=storage.bucket_name, Key=storage_key(storage, name))
+        return ContentFile(obj['Body'].read(), name=name)
+
+    def exists(storage, name):
+        return storage_key(storage, name) in s3.buckets[storage.bucket_name]
+
+    def delete(storage, name):
+        s3.delete_object(Bucket=storage.bucket_name, Key=storage_key(storage, name))
+
+    def size(storage, name):
+        return s3.head_object(Bucket=storage.bucket_name, Key=storage_key(storage, name))['ContentLength']
+
+    def url(storage, name, *args, **kwargs):
+        return f'https://{storage.custom_domain or storage.bucket_name}/{storage_key(storage, name)}'
+
+    with mock.patch.multiple(S3Boto3Storage, _save=_save, _open=_open, exists=exists, delete=delete, size=size,
+                             url=url):
+        yield
+
+
+@lru_cache(maxsize=1)
+def generate_keypair_pem():
+    # Key generation is slow, and a throwaway key can be shared by every stub
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+@contextmanager
+def stub_aws():
+    """
+    Route every boto3 client (``s3_client()``/``cf_client()`` included) and S3
+    storages to in-memory stubs and sign CloudFront URLs with a throwaway key,
+    so storage and signing code runs offline. Clients are stubbed in boto3
+    itself, so callers can't escape the stub however they import them.
+
+    :return: ``(StubS3Client, StubCloudFrontClient)``
+    """
+    s3 = StubS3Client()
+    cf = StubCloudFrontClient()
+    clients = {'s3': s3, 'cloudfront': cf}
+
+    def client(service_name, *args, **kwargs):
+        try:
+            return clients[service_name]
+        except KeyError:
+            raise NotImplementedError(f'No stub for the boto3 {service_name!r} client')
+
+    def session_client(session, service_name, *args, **kwargs):
+        return client(service_name)
+
+    def clear_cached_clients():
+        util_aws.s3_client.cache_clear()
+        util_aws.cf_client.cache_clear()
+
+    # Clients cached before or during the stub must not outlive it
+    clear_cached_clients()
+    try:
+        with mock.patch('boto3.client', client), \
+                mock.patch.object(boto3.session.Session, 'client', session_client), \
+                stub_s3_storage(s3), \
+                override_settings(CF_KEYPAIR_ID='STUBKEYPAIRID', CF_KEYPAIR_PEM=generate_keypair_pem()):
+            yield s3, cf
+    finally:
+        clear_cached_clients()
@@ -0,0 +1,108 @@
+import logging
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.test import TestCase
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from jarrett.testing.aws_stub import storage_key, stub_aws
+from jarrett.util_aws import s3_client
+
+logger = logging.getLogger(__name__)
+
+
+class S3CleanupError(Exception):
+    pass
+
+
+class S3CleanupTestCase(TestCase):
+    """
+    Base test class that records every file saved through an S3 storage and
+    deletes them again afterwards: files saved during a test in ``tearDown``,
+    files saved in ``setUpClass``/``setUpTestData`` in ``tearDownClass``.
+    Deletes are sent in batches of up to 1000 keys per ``delete_objects`` call.
+
+    With ``stub_s3`` (the default) S3, CloudFront and the storages are replaced
+    by in-process stubs, so nothing reaches AWS. Set it to ``False`` to run
+    against the real buckets, where any file saved by the test is deleted.
+    """
+    stub_s3 = True
+    delete_batch_size = 1000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.uploaded_keys = defaultdict(set)
+        cls._s3_patches = ExitStack()
+        if cls.stub_s3:
+            cls.s3_stub, cls.cf_stub = cls._s3_patches.enter_context(stub_aws())
+        cls._s3_patches.enter_context(track_s3_uploads(cls.uploaded_keys))
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._s3_patches.close()
+            raise
+        cls._class_uploaded_keys = {bucket: set(keys) for bucket, keys in cls.uploaded_keys.items()}
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            try:
+                cls.delete_s3_keys(cls.uploaded_keys)
+            finally:
+                cls._s3_patches.close()
+
+    @classmethod
+    def delete_s3_keys(cls, keys_by_bucket):
+        """
+        Delete ``{bucket_name: {key, ...}}`` from S3.
+
+        :raises S3CleanupError: listing every key S3 refused to delete, once
+            all batches have been sent
+        """
+        s3 = None
+        errors = []
+        for bucket, keys in keys_by_bucket.items():
+            keys = sorted(keys)
+            for i in range(0, len(keys), cls.delete_batch_size):
+                batch = keys[i:i + cls.delete_batch_size]
+                logger.info('Deleting %d files from S3 %s', len(batch), bucket)
+                s3 = s3 or s3_client()
+                response = s3.delete_objects(Bucket=bucket, Delete={
+                    'Objects': [{'Key': key} for key in batch],
+                    'Quiet': True,
+                })
+                errors += [f'{bucket}/{error["Key"]} ({error.get("Code")}: {error.get("Message")})'
+                           for error in response.get('Errors', [])]
+        if errors:
+            raise S3CleanupError(f'Failed to delete {len(errors)} files from S3: {", ".join(errors)}')
+
+    def tearDown(self):
+        test_keys = {bucket: keys - self._class_uploaded_keys.get(bucket, set())
+                     for bucket, keys in self.uploaded_keys.items()}
+        try:
+            self.delete_s3_keys(test_keys)
+            # Keys that failed stay registered, so tearDownClass tries them again
+            for bucket, keys in test_keys.items():
+                self.uploaded_keys[bucket] -= keys
+        finally:
+            super().tearDown()
+
+
+@contextmanager
+def track_s3_uploads(uploaded_keys):
+    """
+    Record the bucket and key of every file saved through an ``S3Boto3Storage``
+    into ``uploaded_keys`` (``{bucket_name: {key, ...}}``).
+    """
+    save = S3Boto3Storage._save
+
+    def _save(storage, name, content):
+        name = save(storage, name, content)
+        uploaded_keys[storage.bucket_name].add(storage_key(storage, name))
+        return name
+
+    with mock.patch.object(S3Boto3Storage, '_save', _save):
+        yield
@@ -5,13 +5,15 @@ from django.contrib.staticfiles.testing import StaticLiveServerTestCase
 from django.core.servers.basehttp import ThreadedWSGIServer
 from django.test.testcases import LiveServerThread, QuietWSGIRequestHandler
 
+from .pool import driver_pool
+
 
 class ConnectionResetErrorSwallowingQuietWSGIRequestHandler(QuietWSGIRequestHandler):
     def handle_one_request(self):
         try:
             super().handle_one_request()
         except socket.error as err:
-            if err.errno != errno.WSAECONNRESET:
+            if err.errno != getattr(errno, 'WSAECONNRESET', errno.ECONNRESET):
                 raise
 
 
@@ -34,5 +36,6 @@ class SeleniumBaseTest(CustomStaticLiveServerTestCase):
 
     @classmethod
     def tearDownClass(cls):
-        cls.web_driver.quit()
+        # Reset against the live server's origin while it is still running
+        driver_pool.release(cls.web_driver, cls.live_server_url)
         super().tearDownClass()
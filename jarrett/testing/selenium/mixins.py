@@ -1,31 +1,22 @@
-from django.conf import settings
-from selenium.webdriver import Chrome, Edge, Firefox
-
-IMPLICIT_WAIT_TIME = settings.SELENIUM_IMPLICIT_WAIT_TIME
+from .pool import driver_pool
 
 
 class ChromeMixin:
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        cls.web_driver = Chrome()
-        cls.web_driver.maximize_window()
-        cls.web_driver.implicitly_wait(IMPLICIT_WAIT_TIME)
+        cls.web_driver = driver_pool.acquire('chrome')
 
 
 class EdgeMixin:
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        cls.web_driver = Edge()
-        cls.web_driver.maximize_window()
-        cls.web_driver.implicitly_wait(IMPLICIT_WAIT_TIME)
+        cls.web_driver = driver_pool.acquire('edge')
 
 
 class FirefoxMixin:
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        cls.web_driver = Firefox()
-        cls.web_driver.maximize_window()
-        cls.web_driver.implicitly_wait(IMPLICIT_WAIT_TIME)
+        cls.web_driver = driver_pool.acquire('firefox')
@@ -0,0 +1,116 @@
+import os
+from collections import defaultdict
+from multiprocessing.util import Finalize
+
+from django.conf import settings
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver import Chrome, ChromeOptions, Edge, EdgeOptions, Firefox, FirefoxOptions
+
+IMPLICIT_WAIT_TIME = settings.SELENIUM_IMPLICIT_WAIT_TIME
+HEADLESS = settings.SELENIUM_HEADLESS
+WINDOW_WIDTH, WINDOW_HEIGHT = 1920, 1080
+
+
+def _start(driver_class, options, headless_arg):
+    if HEADLESS:
+        options.add_argument(headless_arg)
+    driver = driver_class(options=options)
+    if HEADLESS:
+        # maximize_window() has no effect without a display
+        driver.set_window_size(WINDOW_WIDTH, WINDOW_HEIGHT)
+    else:
+        driver.maximize_window()
+    return driver
+
+
+def chrome():
+    return _start(Chrome, ChromeOptions(), '--headless')
+
+
+def edge():
+    return _start(Edge, EdgeOptions(), '--headless')
+
+
+def firefox():
+    return _start(Firefox, FirefoxOptions(), '-headless')
+
+
+class DriverPool:
+    """
+    Per-process pool of browser sessions shared between test classes.
+
+    Starting a browser takes seconds, so instead of quitting it in
+    ``tearDownClass`` the session is reset (cookies, local and session
+    storage) and handed to the next class. Each process of
+    ``manage.py test --parallel`` gets its own pool, and its own live server
+    port from ``LiveServerTestCase``.
+    """
+    factories = {
+        'chrome': chrome,
+        'edge': edge,
+        'firefox': firefox,
+    }
+
+    def __init__(self):
+        self._pid = None
+        self._check_fork()
+
+    def _check_fork(self):
+        # Sessions inherited from a parent process belong to the parent
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = defaultdict(list)
+            self._browsers = {}
+            self._finalizer = None
+
+    def acquire(self, browser):
+        self._check_fork()
+        if self._finalizer is None:
+            # Unlike atexit, multiprocessing finalizers also run in --parallel worker processes
+            self._finalizer = Finalize(None, self.close_all, exitpriority=10)
+        idle = self._idle[browser]
+        driver = idle.pop() if idle else self.factories[browser]()
+        self._browsers[driver] = browser
+        driver.implicitly_wait(IMPLICIT_WAIT_TIME)
+        return driver
+
+    @staticmethod
+    def reset(driver, url):
+        """
+        Clear the cookies and web storage a test class left behind. Cookies and
+        storage are per origin, so ``url`` (the live server URL) is loaded
+        first; Chrome and Edge also drop the cookies of every other origin
+        through DevTools. Any failure propagates, so ``release`` quits a
+        session it couldn't clean.
+        """
+        if hasattr(driver, 'execute_cdp_cmd'):
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.get(url)
+        driver.delete_all_cookies()
+        driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+        driver.get('about:blank')
+
+    def release(self, driver, url):
+        self._check_fork()
+        browser = self._browsers.pop(driver, None)
+        try:
+            self.reset(driver, url)
+        except WebDriverException:
+            browser = None
+        if browser is None:
+            driver.quit()
+        else:
+            self._idle[browser].append(driver)
+
+    def close_all(self):
+        self._check_fork()
+        for drivers in self._idle.values():
+            for driver in drivers:
+                try:
+                    driver.quit()
+                except WebDriverException:
+                    pass
+        self._idle.clear()
+
+
+driver_pool = DriverPool()
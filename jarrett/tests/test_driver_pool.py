@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from selenium.common.exceptions import WebDriverException
+
+from jarrett.testing.selenium.pool import DriverPool
+
+URL = 'http://localhost:8081'
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.calls = []
+        self.quit = mock.Mock()
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def get(self, url):
+        self.calls.append(('get', url))
+
+    def delete_all_cookies(self):
+        self.calls.append(('delete_all_cookies',))
+
+    def execute_script(self, script):
+        self.calls.append(('execute_script',))
+
+
+class FakeChromeDriver(FakeDriver):
+
+    def execute_cdp_cmd(self, cmd, args):
+        self.calls.append((cmd,))
+
+
+class DriverPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        finalize = mock.patch('jarrett.testing.selenium.pool.Finalize')
+        finalize.start()
+        self.addCleanup(finalize.stop)
+        self.pool = DriverPool()
+        self.pool.factories = {'chrome': FakeChromeDriver, 'firefox': FakeDriver}
+
+    def test_release_reuses_session(self):
+        driver = self.pool.acquire('chrome')
+        self.pool.release(driver, URL)
+        self.assertIs(self.pool.acquire('chrome'), driver)
+        self.assertIsNot(self.pool.acquire('chrome'), driver)
+        driver.quit.assert_not_called()
+
+    def test_reset_clears_live_server_origin(self):
+        for browser, cdp_calls in [('chrome', [('Network.clearBrowserCookies',)]), ('firefox', [])]:
+            with self.subTest(browser=browser):
+                driver = self.pool.acquire(browser)
+                self.pool.release(driver, URL)
+                self.assertEqual(driver.calls, cdp_calls + [
+                    ('get', URL), ('delete_all_cookies',), ('execute_script',), ('get', 'about:blank'),
+                ])
+
+    def test_failed_reset_quits_driver(self):
+        driver = self.pool.acquire('chrome')
+        with mock.patch.object(driver, 'execute_script', side_effect=WebDriverException('gone')):
+            self.pool.release(driver, URL)
+        driver.quit.assert_called_once_with()
+        self.assertIsNot(self.pool.acquire('chrome'), driver)
+
+    def test_sessions_not_shared_after_fork(self):
+        driver = self.pool.acquire('chrome')
+        self.pool.release(driver, URL)
+        with mock.patch('jarrett.testing.selenium.pool.os.getpid', return_value=-1):
+            self.assertIsNot(self.pool.acquire('chrome'), driver)
+        # The parent's session is left for the parent to quit
+        driver.quit.assert_not_called()
+
+    def test_close_all(self):
+        drivers = [self.pool.acquire('chrome'), self.pool.acquire('firefox')]
+        drivers[0].quit.side_effect = WebDriverException('already gone')
+        for driver in drivers:
+            self.pool.release(driver, URL)
+        self.pool.close_all()
+        for driver in drivers:
+            driver.quit.assert_called_once_with()
+        self.assertIsNot(self.pool.acquire('firefox'), drivers[1])
@@ -0,0 +1,140 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.template.backends.django import Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from jarrett.instrumentation import (
+    DB_QUERIES, DB_SECONDS, TEMPLATE_SECONDS, aggregate_snapshots, install, registry, render_prometheus, uninstall,
+)
+
+
+def histogram_snapshot(counts, total, buckets=(0.1, 1)):
+    return {'documentation': 'Test histogram', 'buckets': list(buckets), 'counts': counts, 'sum': total}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class InstallTest(SimpleTestCase):
+
+    def test_uninstall_restores_patches(self):
+        install()
+        patched = Template.render
+        uninstall()
+        self.addCleanup(install)
+        self.assertIs(Template.render, patched.__wrapped__)
+
+
+class InstrumentationMiddlewareTest(TestCase):
+
+    def test_flush_errors_do_not_fail_request(self):
+        registry._last_flush = 0.0
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir), \
+                mock.patch('jarrett.instrumentation.os.replace', side_effect=OSError('disk full')), \
+                self.assertLogs('jarrett.instrumentation', 'ERROR'):
+            response = self.client.get(reverse('admin:login'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_db_and_template_timings_recorded(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        before = {histogram: histogram.snapshot() for histogram in (DB_SECONDS, DB_QUERIES, TEMPLATE_SECONDS)}
+        response = self.client.get(reverse('admin:index'))
+        self.assertEqual(response.status_code, 200)
+        for histogram, snapshot in before.items():
+            with self.subTest(histogram=histogram.name):
+                self.assertEqual(sum(histogram.counts), sum(snapshot['counts']) + 1)
+                self.assertGreater(histogram.sum, snapshot['sum'])
+        # Session and user lookups at least
+        self.assertGreaterEqual(DB_QUERIES.sum - before[DB_QUERIES]['sum'], 2)
+
+
+class AggregateSnapshotsTest(SimpleTestCase):
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.metrics_dir = metrics_dir.name
+
+    def write_snapshot(self, pid, snapshot):
+        with open(os.path.join(self.metrics_dir, f'worker-{pid}.json'), 'w') as f:
+            json.dump(snapshot, f)
+
+    def test_sums_workers(self):
+        self.write_snapshot(os.getpid(), {'requests': histogram_snapshot([1, 2, 0], 1.5)})
+        self.write_snapshot(os.getppid(), {'requests': histogram_snapshot([3, 0, 1], 4.0)})
+        merged = aggregate_snapshots(self.metrics_dir)
+        self.assertEqual(merged['requests']['counts'], [4, 2, 1])
+        self.assertEqual(merged['requests']['sum'], 5.5)
+
+    def test_dead_workers_are_archived(self):
+        pid = dead_pid()
+        self.write_snapshot(os.getpid(), {'requests': histogram_snapshot([1, 0, 0], 0.5)})
+        self.write_snapshot(pid, {'requests': histogram_snapshot([0, 2, 0], 1.0)})
+        for _ in range(2):
+            merged = aggregate_snapshots(self.metrics_dir)
+            self.assertEqual(merged['requests']['counts'], [1, 2, 0])
+            self.assertEqual(merged['requests']['sum'], 1.5)
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, f'worker-{pid}.json')))
+
+    def test_archived_worker_not_counted_twice(self):
+        # As if the previous scrape died between writing the archive and removing the snapshot
+        pid = dead_pid()
+        self.write_snapshot(pid, {'requests': histogram_snapshot([0, 2, 0], 1.0)})
+        with open(os.path.join(self.metrics_dir, 'archive.json'), 'w') as f:
+            json.dump({'pids': [pid], 'metrics': {'requests': histogram_snapshot([0, 2, 0], 1.0)}}, f)
+        self.assertEqual(aggregate_snapshots(self.metrics_dir)['requests']['counts'], [0, 2, 0])
+        self.assertEqual(aggregate_snapshots(self.metrics_dir)['requests']['counts'], [0, 2, 0])
+
+    def test_render_prometheus_cumulative_buckets(self):
+        text = render_prometheus({'jarrett_test_seconds': histogram_snapshot([1, 2, 3], 7.5)})
+        self.assertEqual(text.splitlines(), [
+            '# HELP jarrett_test_seconds Test histogram',
+            '# TYPE jarrett_test_seconds histogram',
+            'jarrett_test_seconds_bucket{le="0.1"} 1',
+            'jarrett_test_seconds_bucket{le="1"} 3',
+            'jarrett_test_seconds_bucket{le="+Inf"} 6',
+            'jarrett_test_seconds_sum 7.5',
+            'jarrett_test_seconds_count 6',
+        ])
+
+
+class MetricsViewTest(TestCase):
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        metrics_settings = override_settings(METRICS_DIR=metrics_dir.name)
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=False)
+    def test_forbidden_without_token_outside_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_open_in_debug_without_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE jarrett_request_seconds histogram', response.content)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_non_ascii_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer \u00e9')
+        self.assertEqual(response.status_code, 403)
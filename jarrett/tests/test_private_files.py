@@ -0,0 +1,204 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from jarrett.private_files import PrivateFileCache, UnsatisfiableRange, content_disposition, parse_range_header
+from jarrett.testing.aws_stub import StubS3Client, stub_aws
+
+KEY = 'docs/report.bin'
+BODY = bytes(range(256)) * 4
+
+
+class ParseRangeHeaderTest(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range_header('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=50-500', 100), (50, 99))
+
+    def test_ignored(self):
+        self.assertIsNone(parse_range_header(None, 100))
+        self.assertIsNone(parse_range_header('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range_header('bytes=9-2', 100))
+        self.assertIsNone(parse_range_header('items=0-1', 100))
+
+    def test_unsatisfiable(self):
+        for header, size in [('bytes=20-', 10), ('bytes=10-20', 10), ('bytes=-0', 10), ('bytes=-3', 0)]:
+            with self.subTest(header=header, size=size), self.assertRaises(UnsatisfiableRange):
+                parse_range_header(header, size)
+
+
+class StubS3ClientRangeTest(SimpleTestCase):
+
+    def setUp(self):
+        self.s3 = StubS3Client()
+        self.s3.put_object(Bucket='bucket', Key=KEY, Body=BODY)
+
+    def get(self, byte_range):
+        return self.s3.get_object(Bucket='bucket', Key=KEY, Range=byte_range)['Body'].read()
+
+    def test_ranges(self):
+        self.assertEqual(self.get('bytes=0-9'), BODY[:10])
+        self.assertEqual(self.get('bytes=1000-'), BODY[1000:])
+        self.assertEqual(self.get('bytes=-24'), BODY[-24:])
+        self.assertEqual(self.get('bytes=9-2'), BODY)
+
+    def test_unsatisfiable(self):
+        with self.assertRaises(ClientError) as cm:
+            self.get(f'bytes={len(BODY)}-')
+        self.assertEqual(cm.exception.response['Error']['Code'], 'InvalidRange')
+
+
+class ContentDispositionTest(SimpleTestCase):
+
+    def test_quoting(self):
+        self.assertEqual(content_disposition('report.bin'), 'attachment; filename="report.bin"')
+        self.assertEqual(content_disposition('a"b\\c.bin'), r'attachment; filename="a\"b\\c.bin"')
+        self.assertEqual(content_disposition('r\u00e9sum\u00e9.pdf'),
+                         "attachment; filename*=utf-8''r%C3%A9sum%C3%A9.pdf")
+        self.assertEqual(content_disposition('a\nb.bin'), "attachment; filename*=utf-8''a%0Ab.bin")
+
+
+class PrivateFileCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.cache = PrivateFileCache(self.root.name, max_bytes=20)
+
+    def put(self, key, age=0):
+        temp_file = self.cache.open_temp()
+        temp_file.write(b'x' * 10)
+        self.cache.commit(temp_file, key, 'etag')
+        if age:
+            then = time.time() - age
+            os.utime(self.cache.path(key, 'etag'), (then, then))
+
+    def cached(self, key):
+        f = self.cache.open(key, 'etag')
+        if f is None:
+            return False
+        f.close()
+        return True
+
+    def test_evicts_least_recently_used(self):
+        self.put('a', age=30)
+        self.put('b', age=20)
+        self.assertTrue(self.cached('a'))  # 'a' is now the most recently used
+        self.put('c')
+        self.assertFalse(self.cached('b'))
+        self.assertTrue(self.cached('a'))
+        self.assertTrue(self.cached('c'))
+
+
+class PrivateFileDownloadTest(TestCase):
+
+    def setUp(self):
+        stub = stub_aws()
+        self.s3, _ = stub.__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        cache_settings = override_settings(PRIVATE_DOWNLOAD_CACHE_DIR=self.cache_dir.name)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.etag = self.s3.put_object(Bucket=settings.S3_PRIVATE_FILES_BUCKET_NAME, Key=KEY, Body=BODY)['ETag']
+        self.url = reverse('private_file', kwargs={'key': KEY})
+        staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+
+    def get(self, **headers):
+        return self.get_key(KEY, **headers)
+
+    def get_key(self, key, **headers):
+        response = self.client.get(reverse('private_file', kwargs={'key': key}), **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_full_download(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, BODY)
+        self.assertEqual(response['Content-Length'], str(len(BODY)))
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_full_download_is_cached(self):
+        self.get()
+        self.s3.buckets[settings.S3_PRIVATE_FILES_BUCKET_NAME][KEY]['Body'] = b'changed'
+        _, content = self.get(HTTP_RANGE='bytes=0-3')
+        self.assertEqual(content, BODY[:4])
+
+    def test_cached_file_evicted_after_response(self):
+        self.get()
+        response = self.client.get(self.url)
+        PrivateFileCache(self.cache_dir.name, max_bytes=0).evict()
+        self.assertEqual(b''.join(response.streaming_content), BODY)
+
+    def test_object_replaced_during_download(self):
+        head_object = self.s3.head_object
+
+        def head_then_replace(**kwargs):
+            head = head_object(**kwargs)
+            if head['ETag'] == self.etag:
+                self.s3.put_object(Bucket=settings.S3_PRIVATE_FILES_BUCKET_NAME, Key=KEY, Body=b'replaced')
+            return head
+
+        with mock.patch.object(self.s3, 'head_object', side_effect=head_then_replace):
+            response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, b'replaced')
+        self.assertEqual(response['Content-Length'], str(len(b'replaced')))
+        self.assertNotEqual(response['ETag'], self.etag)
+
+    def test_content_disposition_escaped(self):
+        key = 'docs/a"b.bin'
+        self.s3.put_object(Bucket=settings.S3_PRIVATE_FILES_BUCKET_NAME, Key=key, Body=BODY)
+        response, _ = self.get_key(key)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], r'attachment; filename="a\"b.bin"')
+
+    def test_range(self):
+        response, content = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, BODY[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(BODY)}')
+
+    def test_suffix_range(self):
+        response, content = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, BODY[-5:])
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(HTTP_RANGE=f'bytes={len(BODY) + 10}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(BODY)}')
+
+    def test_if_none_match(self):
+        response, content = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(content, b'')
+
+    def test_if_range_mismatch_sends_full_object(self):
+        response, content = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, BODY)
+
+    def test_missing_object(self):
+        response = self.client.get(reverse('private_file', kwargs={'key': 'missing.bin'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_staff_redirected(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
@@ -0,0 +1,120 @@
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, modify_settings, override_settings
+
+from jarrett.compress_toolchain.profiler import BuildProfiler
+from jarrett.storage_backends import CachedStaticStorage
+from jarrett.testing.aws_stub import stub_aws
+
+# Upper-cases {infile}, into {outfile} when given
+UPPER_SCRIPT = 'import sys; data = open(sys.argv[1]).read().upper(); ' \
+               'open(sys.argv[2], "w").write(data) if len(sys.argv) > 2 else sys.stdout.write(data)'
+
+
+class BuildProfilerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def build(self, command, span):
+        profiler = BuildProfiler(self.output_dir.name, command=command)
+        with profiler.span(span, 'compile', input_size=100) as args:
+            args['output_size'] = 50
+        with redirect_stdout(StringIO()) as out:
+            profiler.write()
+        profiler.events = []  # Nothing left for the atexit hook to write
+        return out.getvalue()
+
+    def test_trace_events(self):
+        self.build('compress', 'SCSSCompiler')
+        trace_file, = [name for name in os.listdir(self.output_dir.name) if name.startswith('trace-compress-')]
+        with open(os.path.join(self.output_dir.name, trace_file)) as f:
+            event, = json.load(f)['traceEvents']
+        self.assertEqual((event['name'], event['cat'], event['ph']), ('SCSSCompiler', 'compile', 'X'))
+        self.assertEqual(event['args'], {'input_size': 100, 'output_size': 50})
+
+    def test_summary_compared_against_same_command(self):
+        self.build('compress', 'SCSSCompiler')
+        self.build('collectstatic', 's3_upload')
+        table = self.build('compress', 'SCSSCompiler')
+        row, = [line for line in table.splitlines() if line.startswith('compile:SCSSCompiler')]
+        self.assertNotIn('new', row)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir.name, 'summary-latest-compress.json')))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir.name, 'summary-latest-collectstatic.json')))
+
+
+class ProfiledBuildTest(SimpleTestCase):
+
+    def setUp(self):
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self.profiler = BuildProfiler(output_dir.name, command='compress')
+        self.addCleanup(setattr, self.profiler, 'events', [])
+        profile_settings = override_settings(BUILD_PROFILE_DIR=output_dir.name)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+        profiler_patch = mock.patch('jarrett.compress_toolchain.profiler._profiler', self.profiler)
+        profiler_patch.start()
+        self.addCleanup(profiler_patch.stop)
+
+    def spans(self, name):
+        return [event['args'] for event in self.profiler.events if event['name'] == name]
+
+    def test_storage_spans(self):
+        with stub_aws() as (s3, cf), tempfile.TemporaryDirectory() as compress_root, \
+                override_settings(COMPRESS_ROOT=compress_root):
+            storage = CachedStaticStorage()
+            storage.save('source/css/kept.css', ContentFile(b'body {}'))
+            storage.save('source/css/stale.css', ContentFile(b'body {}'))
+            # compress finds kept.css and skips it, collectstatic finds stale.css and uploads it again
+            self.assertTrue(storage.exists('source/css/kept.css'))
+            self.assertTrue(storage.exists('source/css/stale.css'))
+            storage.save('source/css/stale.css', ContentFile(b'p {}'))
+            storage.save('source/manifest.json', ContentFile(b'{}'))
+            self.assertTrue(os.path.exists(os.path.join(compress_root, 'source', 'css', 'kept.css')))
+
+        self.assertEqual({span['path']: span['cache_hit'] for span in self.spans('exists')},
+                         {'source/css/kept.css': True, 'source/css/stale.css': False})
+        self.assertEqual(len(self.spans('local_save')), 4)
+        self.assertEqual([span['output_size'] for span in self.spans('s3_upload')], [7, 7, 4, 2])
+        self.assertEqual([span['path'] for span in self.spans('invalidate_static_manifest')], ['source/manifest.json'])
+        self.assertEqual(len(cf.invalidations), 1)
+        self.assertIn(f'{CachedStaticStorage.location}/source/css/kept.css',
+                      s3.buckets[CachedStaticStorage.bucket_name])
+
+    @skipUnless(importlib.util.find_spec('compressor_toolkit'), 'django-compressor-toolkit is not installed')
+    def test_compiler_span(self):
+        with modify_settings(INSTALLED_APPS={'append': 'compressor_toolkit'}):
+            from jarrett.compress_toolchain.precompilers import BaseCompiler, shell_quote
+
+        class UpperCompiler(BaseCompiler):
+            command = f'{shell_quote(sys.executable)} -c {shell_quote(UPPER_SCRIPT)} {{infile}}'
+
+        class UpperFileCompiler(UpperCompiler):
+            command = UpperCompiler.command + ' {outfile}'
+
+        compiler = UpperCompiler('body {}', charset='utf-8')
+        self.assertEqual(compiler.input(), 'BODY {}')
+        with tempfile.NamedTemporaryFile('w', suffix='.scss', delete=False) as source:
+            source.write('p {}')
+        self.addCleanup(os.remove, source.name)
+        self.assertEqual(UpperFileCompiler('p {}', filename=source.name, charset='utf-8').input(), 'P {}')
+
+        temp_span, file_span = self.spans('UpperCompiler') + self.spans('UpperFileCompiler')
+        self.assertEqual(temp_span, {
+            'command': UpperCompiler.command.format(infile=shell_quote(compiler.infile.name)),
+            'filename': None, 'input_size': 7, 'output_size': 7, 'cache_hit': False,
+        })
+        # {outfile} is only created inside CompilerFilter.input(), so it stays a placeholder
+        self.assertEqual(file_span['command'], UpperFileCompiler.command.replace('{infile}', shell_quote(source.name)))
+        self.assertIn('{outfile}', file_span['command'])
+        self.assertEqual(file_span['output_size'], 4)
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+import boto3
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase
+
+from jarrett import util_aws
+from jarrett.storage_backends import PrivateStorage
+from jarrett.testing.aws_stub import stub_aws
+from jarrett.testing.s3_cleanup import S3CleanupError, S3CleanupTestCase
+
+BUCKET = 'cleanup-bucket'
+
+
+def run_test_case(test_case_class):
+    """
+    Run ``test_case_class`` on its own, class fixtures included.
+    """
+    result = unittest.TestResult()
+    unittest.defaultTestLoader.loadTestsFromTestCase(test_case_class).run(result)
+    return result
+
+
+class StubAwsTest(SimpleTestCase):
+
+    def test_every_client_is_stubbed(self):
+        with stub_aws() as (s3, cf):
+            self.assertIs(util_aws.s3_client(), s3)
+            self.assertIs(util_aws.cf_client(), cf)
+            self.assertIs(boto3.client('s3'), s3)
+            self.assertIs(boto3.session.Session().client('cloudfront'), cf)
+        # Cached stub clients must not leak out of the stub
+        self.assertEqual(util_aws.s3_client.cache_info().currsize, 0)
+        self.assertEqual(util_aws.cf_client.cache_info().currsize, 0)
+
+
+class DeleteS3KeysTest(TestCase):
+
+    def setUp(self):
+        patches = stub_aws()
+        self.s3, _ = patches.__enter__()
+        self.addCleanup(patches.__exit__, None, None, None)
+
+    def test_batches(self):
+        keys = {f'uploads/{i:04}.txt' for i in range(1500)}
+        for key in keys:
+            self.s3.put_object(Bucket=BUCKET, Key=key, Body=b'x')
+        with mock.patch.object(self.s3, 'delete_objects', wraps=self.s3.delete_objects) as delete_objects:
+            S3CleanupTestCase.delete_s3_keys({BUCKET: keys})
+        self.assertEqual([len(call.kwargs['Delete']['Objects']) for call in delete_objects.call_args_list],
+                         [1000, 500])
+        self.assertEqual(self.s3.buckets[BUCKET], {})
+
+    def test_errors_raise_with_failing_keys(self):
+        errors = {'Errors': [{'Key': 'uploads/locked.txt', 'Code': 'AccessDenied', 'Message': 'Access Denied'}]}
+        with mock.patch.object(self.s3, 'delete_objects', return_value=errors), \
+                self.assertRaisesMessage(S3CleanupError, f'{BUCKET}/uploads/locked.txt (AccessDenied'):
+            S3CleanupTestCase.delete_s3_keys({BUCKET: {'uploads/locked.txt', 'uploads/ok.txt'}})
+
+
+class S3CleanupTestCaseTest(TestCase):
+
+    def test_class_files_survive_until_tear_down_class(self):
+        seen = []
+
+        class Inner(S3CleanupTestCase):
+
+            @classmethod
+            def setUpTestData(cls):
+                cls.storage = PrivateStorage()
+                cls.class_key = cls.storage.save('class.txt', ContentFile(b'class'))
+
+            def check(self):
+                self.storage.save(f'{self._testMethodName}.txt', ContentFile(b'test'))
+                seen.append(sorted(self.s3_stub.buckets[self.storage.bucket_name]))
+
+            def test_a(self):
+                self.check()
+
+            def test_b(self):
+                self.check()
+
+        result = run_test_case(Inner)
+        self.assertTrue(result.wasSuccessful(), result.errors + result.failures)
+        # Each test sees the class file and only its own test file
+        self.assertEqual(seen, [['class.txt', 'test_a.txt'], ['class.txt', 'test_b.txt']])
+        self.assertEqual(Inner.s3_stub.buckets[Inner.storage.bucket_name], {})
+
+    def test_stub_never_builds_boto3_client(self):
+
+        class Inner(S3CleanupTestCase):
+
+            def test_save_and_read(self):
+                storage = PrivateStorage()
+                name = storage.save('stubbed.txt', ContentFile(b'stubbed'))
+                with storage.open(name) as f:
+                    self.assertEqual(f.read(), b'stubbed')
+
+        # Every real client and resource, however it is created, goes through botocore
+        with mock.patch('botocore.session.Session.create_client') as create_client:
+            result = run_test_case(Inner)
+        self.assertTrue(result.wasSuccessful(), result.errors + result.failures)
+        create_client.assert_not_called()
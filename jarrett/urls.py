@@ -15,9 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from .views import Index
+from .instrumentation import metrics
+from .views import Index, PrivateFileDownload
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
+    path('private/<path:key>', PrivateFileDownload.as_view(), name='private_file'),
     path('', Index.as_view(), name='index')
 ]
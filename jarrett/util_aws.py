@@ -1,5 +1,6 @@
 import datetime
 import logging
+from functools import lru_cache
 
 import boto3
 from botocore.exceptions import ClientError
@@ -9,10 +10,11 @@ from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from django.conf import settings
 from django.db import models
-from django.db.models.fields.files import FieldFile, FileField, ImageField, ImageFile
-from django.test import TestCase
+from django.db.models.fields.files import FieldFile, ImageFile
 from django.utils.timezone import now
 
+from jarrett.instrumentation import register_boto_events
+
 
 class CFFieldFile(FieldFile):
     @property
@@ -36,72 +38,41 @@ class CFImageFileField(models.FileField):
     description = "CloudFront Image File"
 
 
+@lru_cache(maxsize=None)
 def s3_client():
-    return boto3.client(
+    # Building a client takes milliseconds; boto3 clients are thread-safe, so share one per process
+    client = boto3.client(
         's3',
         aws_secret_access_key=settings.S3_SECRET_KEY,
         aws_access_key_id=settings.S3_ACCESS_KEY
     )
+    register_boto_events(client.meta.events)
+    return client
 
 
+@lru_cache(maxsize=None)
 def cf_client():
-    return boto3.client(
+    client = boto3.client(
         'cloudfront',
         aws_secret_access_key=settings.CF_SECRET_KEY,
         aws_access_key_id=settings.CF_ACCESS_KEY
     )
+    register_boto_events(client.meta.events)
+    return client
 
 
-class S3CleanupTestCase(TestCase):
-    """
-    Base test class that will scan the TestCase instance for related
-    models with Files and try and delete anything from S3
-
-    Could potentially delete real data if data provided to filefields
-    is not dummy data
-    """
-
-    @staticmethod
-    def delete_s3_file_fields(dj_model):
-        model_fields = dj_model._meta.fields
-        for field in model_fields:
-            if type(field) in [FileField, ImageField, CFFileField, CFImageFileField]:
-                if getattr(dj_model, field.name):
-                    print(f'Deleting from S3 {field.storage.bucket.name}/'
-                          f'{field.storage.location}/'
-                          f'{getattr(dj_model, field.name).name}')
-                    s3 = s3_client()
-                    s3.delete_object(Bucket=field.storage.bucket.name,
-                                     Key=f'{field.storage.location}/'
-                                         f'{getattr(dj_model, field.name).name}')
-        return dj_model
-
-    @staticmethod
-    def scan_object_for_django_models(obj_list):
-        dj_models = set()
-        new_models = set()
-        for obj in obj_list:
-            if obj:
-                for val in obj.__dict__:
-                    if isinstance(getattr(obj, val), models.Model):
-                        dj_models.add(getattr(obj, val))
-        if dj_models:
-            new_models = S3CleanupTestCase.scan_object_for_django_models(dj_models)
-        return dj_models.union(new_models)
-
-    def tearDown(self):
-        related_dj_models = self.scan_object_for_django_models([self])
-        for model in related_dj_models:
-            self.delete_s3_file_fields(model)
-        super().tearDown()
-
-
-def rsa_signer(message):
-    private_key = serialization.load_pem_private_key(
-        settings.CF_KEYPAIR_PEM.encode(),
+@lru_cache(maxsize=1)
+def load_private_key(pem):
+    # Parsing and validating the key dominates signing time, so only do it once per key
+    return serialization.load_pem_private_key(
+        pem.encode(),
         password=None,
         backend=default_backend()
     )
+
+
+def rsa_signer(message):
+    private_key = load_private_key(settings.CF_KEYPAIR_PEM)
     return private_key.sign(message, padding.PKCS1v15(), hashes.SHA1())
 
 
@@ -1,5 +1,96 @@
-from django.views.generic import TemplateView
+import os
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.generic import TemplateView, View
+
+from jarrett.private_files import (PrivateFileCache, UnsatisfiableRange, content_disposition, etag_matches,
+                                   parse_range_header, stream_file, stream_s3_body)
+from jarrett.util_aws import s3_client
 
 
 class Index(TemplateView):
     template_name = 'index.html'
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class PrivateFileDownload(View):
+    """
+    Proxy a ``PrivateStorage`` object through the app in fixed-size chunks.
+
+    Memory use per download is bounded by ``chunk_size`` regardless of the
+    object size. Supports single ``Range`` requests and ``If-None-Match``;
+    small objects are kept in a bounded local disk cache.
+    """
+    chunk_size = settings.PRIVATE_DOWNLOAD_CHUNK_SIZE
+    # Times to start over if the object is replaced between head_object and get_object
+    attempts = 2
+
+    def get(self, request, key):
+        for attempt in range(self.attempts):
+            try:
+                return self.download(request, key)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'PreconditionFailed' or attempt == self.attempts - 1:
+                    raise
+
+    def download(self, request, key):
+        s3 = s3_client()
+        bucket = settings.S3_PRIVATE_FILES_BUCKET_NAME
+        try:
+            head = s3.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise Http404(key)
+            raise
+
+        etag = head['ETag']
+        size = head['ContentLength']
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag:
+            range_header = None
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        cache = PrivateFileCache(settings.PRIVATE_DOWNLOAD_CACHE_DIR, settings.PRIVATE_DOWNLOAD_CACHE_MAX_BYTES)
+        cached_file = cache.open(key, etag)
+        if cached_file:
+            content = stream_file(cached_file, start, length, self.chunk_size)
+        elif byte_range:
+            # IfMatch makes S3 fail rather than send a different object than head_object described
+            obj = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', IfMatch=etag)
+            content = stream_s3_body(obj['Body'], self.chunk_size)
+        else:
+            obj = s3.get_object(Bucket=bucket, Key=key, IfMatch=etag)
+            if size <= settings.PRIVATE_DOWNLOAD_CACHE_MAX_OBJECT_BYTES:
+                content = stream_s3_body(obj['Body'], self.chunk_size, cache=cache, key=key, etag=etag)
+            else:
+                content = stream_s3_body(obj['Body'], self.chunk_size)
+
+        response = StreamingHttpResponse(
+            content,
+            status=206 if byte_range else 200,
+            content_type=head.get('ContentType', 'application/octet-stream'),
+        )
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = content_disposition(os.path.basename(key))
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response